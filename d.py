@@ -2,6 +2,7 @@ import os
 import re
 import asyncio
 import logging
+import tempfile
 from typing import List, Dict, Optional
 from pathlib import Path
 
@@ -23,6 +24,11 @@ TOKEN = "8408158472:AAFywjucuPlyYeRNJ-xbFTowMVJNta6i3e8"  # Replace with your bo
 DOWNLOAD_PATH = "downloads"
 MAX_FILE_SIZE = 2000 * 1024 * 1024  # 2GB
 MAX_BULK_ITEMS = 50
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024  # 50MB
+USE_MEMORY_SPOOL = True  # Stream small media through memory instead of disk
+SPOOL_THRESHOLD = 50 * 1024 * 1024  # Per-item memory spool size (spills to disk above)
+SPOOL_MEMORY_LIMIT = 200 * 1024 * 1024  # Total memory shared by all spools
+SPOOL_CHUNK_SIZE = 64 * 1024
 SUPPORTED_DOMAINS = [
     'youtube.com', 'youtu.be',  # YouTube
     'facebook.com', 'fb.watch',  # Facebook
@@ -47,8 +53,75 @@ logger = logging.getLogger(__name__)
 # Ensure download directory exists
 Path(DOWNLOAD_PATH).mkdir(exist_ok=True)
 
+class SpoolBudget:
+    """Global memory budget shared by all in-memory spools"""
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+    
+    def try_reserve(self, size: int) -> bool:
+        """Reserve memory without waiting; False when the budget is exhausted"""
+        if self.used + size > self.limit:
+            return False
+        self.used += size
+        return True
+    
+    def release(self, size: int):
+        """Return reserved memory to the budget"""
+        self.used = max(0, self.used - size)
+
+class MediaSpool:
+    """Bounded memory buffer that spills to disk above SPOOL_THRESHOLD.
+    
+    PTB reads the whole document into memory before uploading it, so the
+    spool holds budget for that upload copy as well as for its own buffer.
+    The caller reserves both (2 * reserved) from the size estimate before
+    creating the spool; each share grows as the file outruns the estimate,
+    and the buffer share is returned as soon as the spool spills to disk.
+    """
+    def __init__(self, budget: SpoolBudget, reserved: int):
+        self.budget = budget
+        self.buffer_reserved = reserved
+        self.upload_reserved = reserved
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD, dir=DOWNLOAD_PATH)
+    
+    def write(self, chunk: bytes):
+        new_size = self.size + len(chunk)
+        
+        # Grow both reservations when the file outruns the estimate
+        buffer_needed = new_size - self.buffer_reserved if new_size <= SPOOL_THRESHOLD else 0
+        upload_needed = new_size - self.upload_reserved
+        needed = max(buffer_needed, 0) + max(upload_needed, 0)
+        if needed > 0:
+            if not self.budget.try_reserve(needed):
+                raise ValueError("Spool memory exhausted")
+            self.buffer_reserved += max(buffer_needed, 0)
+            self.upload_reserved += max(upload_needed, 0)
+        
+        self.file.write(chunk)
+        self.size += len(chunk)
+        
+        # SpooledTemporaryFile rolls over to disk once it grows past max_size,
+        # freeing the buffer memory, so free its budget too
+        if self.buffer_reserved and self.size > SPOOL_THRESHOLD:
+            self.budget.release(self.buffer_reserved)
+            self.buffer_reserved = 0
+    
+    def open(self):
+        """Rewind and return the spool for upload (PTB reads it fully into memory)"""
+        self.file.seek(0)
+        return self.file
+    
+    def close(self):
+        self.file.close()
+        self.budget.release(self.buffer_reserved + self.upload_reserved)
+        self.buffer_reserved = 0
+        self.upload_reserved = 0
+
 class VideoDownloader:
     def __init__(self):
+        self.spool_budget = SpoolBudget(SPOOL_MEMORY_LIMIT)
         self.ydl_opts = {
             'format': 'best',
             'outtmpl': f'{DOWNLOAD_PATH}/%(title)s.%(ext)s',
@@ -105,21 +178,177 @@ class VideoDownloader:
             return 'pinterest'
         return 'generic'
     
-    async def download_video(self, url: str, quality: str = 'best') -> Optional[Dict]:
-        """Download single video"""
+    def build_opts(self, url: str, quality: str = 'best') -> Dict:
+        """Merge base, platform specific and quality options"""
+        platform = self.get_platform(url)
+        ydl_opts = self.ydl_opts.copy()
+        if platform in self.platform_opts:
+            ydl_opts.update(self.platform_opts[platform])
+        
+        if quality != 'best':
+            ydl_opts['format'] = quality
+        
+        return ydl_opts
+    
+    async def fetch_media(self, url: str, quality: str = 'best') -> Optional[Dict]:
+        """Download single video, through the memory spool when possible"""
+        try:
+            with yt_dlp.YoutubeDL(self.build_opts(url, quality)) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            logger.error(f"Extraction error: {e}")
+            return None
+        
+        if not info:
+            return None
+        
+        if USE_MEMORY_SPOOL:
+            result = await self.download_to_spool(url, info, quality)
+            if result:
+                return result
+        return await self.download_video(url, quality, info=info)
+    
+    async def download_to_spool(self, url: str, info: Dict, quality: str = 'best') -> Optional[Dict]:
+        """Stream an already extracted single-file video into a memory spool.
+        
+        Only media that fits in a Telegram upload is spooled; the stream is
+        aborted once it passes TELEGRAM_UPLOAD_LIMIT. Returns None when the
+        media needs the disk path (merged formats, fragmented protocols,
+        oversized files, or no spool memory left), so the caller can fall
+        back to download_video.
+        """
+        spool = None
         try:
             platform = self.get_platform(url)
             
-            # Merge platform specific options
-            ydl_opts = self.ydl_opts.copy()
-            if platform in self.platform_opts:
-                ydl_opts.update(self.platform_opts[platform])
+            if 'entries' in info or info.get('requested_formats'):
+                return None
+            if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+                return None
+            
+            expected = info.get('filesize') or info.get('filesize_approx')
+            if expected and expected > TELEGRAM_UPLOAD_LIMIT:
+                return None
+            
+            # Reserve the buffer plus the copy PTB makes when uploading
+            reserved = min(expected or SPOOL_THRESHOLD, SPOOL_THRESHOLD)
+            if not self.spool_budget.try_reserve(2 * reserved):
+                logger.info("Spool memory exhausted, using disk download")
+                return None
+            spool = MediaSpool(self.spool_budget, reserved)
+            
+            ydl_opts = self.build_opts(url, quality)
+            headers = dict(info.get('http_headers') or {})
+            # info['cookies'] is Set-Cookie style; build a request header from the jar
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                cookie_header = ydl.cookiejar.get_cookie_header(info['url'])
+            if cookie_header:
+                headers['Cookie'] = cookie_header
+            if ydl_opts.get('referer'):
+                headers.setdefault('Referer', ydl_opts['referer'])
+            chunk_size = (info.get('downloader_options') or {}).get('http_chunk_size')
+            
+            timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=30)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                await self.stream_to_spool(
+                    session, info['url'], headers, spool,
+                    chunk_size=chunk_size, proxy=ydl_opts.get('proxy')
+                )
             
-            if quality != 'best':
-                ydl_opts['format'] = quality
+            return {
+                'title': info.get('title', 'Unknown'),
+                'duration': info.get('duration', 0),
+                'size': spool.size,
+                'path': None,
+                'spool': spool,
+                'thumbnail': info.get('thumbnail'),
+                'platform': platform
+            }
+        except Exception as e:
+            logger.error(f"Spool download error: {e}")
+            if spool:
+                spool.close()
+            return None
+        except BaseException:
+            # Cancellation must still return the spool's budget reservation
+            if spool:
+                spool.close()
+            raise
+    
+    async def stream_to_spool(self, session: aiohttp.ClientSession, media_url: str, headers: Dict,
+                              spool: 'MediaSpool', chunk_size: Optional[int] = None,
+                              proxy: Optional[str] = None):
+        """Fetch media into the spool, in Range chunks when the extractor asks for them"""
+        start = 0
+        while True:
+            request_headers = dict(headers)
+            if chunk_size:
+                request_headers['Range'] = f'bytes={start}-{start + chunk_size - 1}'
+            
+            received = 0
+            async with session.get(media_url, headers=request_headers, proxy=proxy) as response:
+                # A range past the end means the previous chunk finished the file
+                if response.status == 416 and start > 0:
+                    return
+                response.raise_for_status()
+                
+                # Bail out before streaming when the server reports an oversized file
+                total = self.response_total_size(response)
+                if total and total > TELEGRAM_UPLOAD_LIMIT:
+                    raise ValueError("File exceeds Telegram upload limit")
+                
+                async for chunk in response.content.iter_chunked(SPOOL_CHUNK_SIZE):
+                    spool.write(chunk)
+                    received += len(chunk)
+                    if spool.size > TELEGRAM_UPLOAD_LIMIT:
+                        raise ValueError("File exceeds Telegram upload limit")
+                
+                # A full (200) response or a short range means the file is complete
+                if not chunk_size or response.status != 206 or received < chunk_size:
+                    return
+                if total and start + received >= total:
+                    return
+            start += received
+    
+    def response_total_size(self, response: aiohttp.ClientResponse) -> Optional[int]:
+        """Total media size from Content-Range (206) or Content-Length (200)"""
+        if response.status == 206:
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            return int(total) if total.isdigit() else None
+        return response.content_length
+    
+    def media_available(self, result: Optional[Dict]) -> bool:
+        """Check that a download result still has content to send"""
+        if not result:
+            return False
+        if result.get('spool'):
+            return True
+        return os.path.exists(result['path'])
+    
+    def open_media(self, result: Dict):
+        """Open a download result for upload"""
+        if result.get('spool'):
+            return result['spool'].open()
+        return open(result['path'], 'rb')
+    
+    def release_media(self, result: Dict):
+        """Free the spool or remove the downloaded file"""
+        if result.get('spool'):
+            result['spool'].close()
+        elif result.get('path') and os.path.exists(result['path']):
+            os.remove(result['path'])
+    
+    async def download_video(self, url: str, quality: str = 'best', info: Optional[Dict] = None) -> Optional[Dict]:
+        """Download single video, reusing extracted info when given"""
+        try:
+            platform = self.get_platform(url)
+            ydl_opts = self.build_opts(url, quality)
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
+                if info:
+                    info = ydl.process_ie_result(info, download=True)
+                else:
+                    info = ydl.extract_info(url, download=True)
                 
                 if info:
                     file_path = ydl.prepare_filename(info)
@@ -485,28 +714,29 @@ Send me a link to get started!
                     f"URL: {url[:40]}..."
                 )
                 
-                result = await self.downloader.download_video(url)
-                if result and os.path.exists(result['path']):
+                result = await self.downloader.fetch_media(url)
+                if self.downloader.media_available(result):
                     success += 1
                     
-                    # Send file if size < 50MB (Telegram limit)
-                    if result['size'] < 50 * 1024 * 1024:
-                        with open(result['path'], 'rb') as f:
-                            await update.message.reply_document(
-                                document=f,
-                                filename=f"{result['title'][:50]}.mp4",
-                                caption=f"✅ {result['title']}\n"
-                                       f"Size: {result['size'] // 1024 // 1024}MB"
+                    try:
+                        # Send file if size < 50MB (Telegram limit)
+                        if result['size'] < TELEGRAM_UPLOAD_LIMIT:
+                            with self.downloader.open_media(result) as f:
+                                await update.message.reply_document(
+                                    document=f,
+                                    filename=f"{result['title'][:50]}.mp4",
+                                    caption=f"✅ {result['title']}\n"
+                                           f"Size: {result['size'] // 1024 // 1024}MB"
+                                )
+                        else:
+                            await update.message.reply_text(
+                                f"📁 File too large for Telegram: {result['title']}\n"
+                                f"Size: {result['size'] // 1024 // 1024}MB\n"
+                                f"Saved to server."
                             )
-                    else:
-                        await update.message.reply_text(
-                            f"📁 File too large for Telegram: {result['title']}\n"
-                            f"Size: {result['size'] // 1024 // 1024}MB\n"
-                            f"Saved to server."
-                        )
-                    
-                    # Clean up
-                    os.remove(result['path'])
+                    finally:
+                        # Clean up
+                        self.downloader.release_media(result)
                 else:
                     failed += 1
                     await update.message.reply_text(f"❌ Failed: {url[:50]}...")
@@ -545,12 +775,12 @@ Send me a link to get started!
             
             if url:
                 await query.edit_message_text(f"⏬ Downloading with {quality} quality...")
-                result = await self.downloader.download_video(url, quality)
+                result = await self.downloader.fetch_media(url, quality)
                 
                 if result:
-                    if os.path.exists(result['path']):
+                    if self.downloader.media_available(result):
                         try:
-                            with open(result['path'], 'rb') as f:
+                            with self.downloader.open_media(result) as f:
                                 await query.message.reply_document(
                                     document=f,
                                     filename=f"{result['title'][:50]}.mp4",
@@ -561,11 +791,11 @@ Send me a link to get started!
                                            f"Downloaded by @{query.from_user.username}" if query.from_user.username else "Downloaded by User"
                                 )
                             
-                            # Clean up
-                            os.remove(result['path'])
-                            
                         except Exception as e:
                             await query.message.reply_text(f"❌ Error sending file: {e}")
+                        finally:
+                            # Clean up
+                            self.downloader.release_media(result)
                     else:
                         await query.message.reply_text("❌ File not found after download.")
                 else: